@@ -1,6 +1,22 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 import requests # Importamos la librería requests
+import orjson
+import glob
+import hashlib
+import os
+import stat
+import tempfile
+import threading
+import time
+from functools import lru_cache, wraps
+from urllib.parse import quote
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from streamlit.runtime.scriptrunner import add_script_run_ctx
 
 # --- Configuración de la página de Streamlit ---
 st.set_page_config(
@@ -19,57 +35,540 @@ except KeyError:
     st.error("Error: No se encontraron las credenciales de Supabase. Asegúrate de configurar tu archivo `secrets.toml`.")
     st.stop()
 
-# --- Función para cargar y procesar los datos con Requests ---
-@st.cache_data(ttl=600) # La caché expira cada 10 minutos
-def load_data():
+# --- Sesión HTTP compartida ---
+@st.cache_resource
+def get_session():
     """
-    Carga los datos desde la API REST de Supabase usando requests,
-    filtrando por blockchain = 'hyperevm'.
+    Devuelve una única requests.Session por proceso para reutilizar las
+    conexiones keep-alive (y el handshake TLS) entre consultas y reruns.
     """
-    columns_to_select = "pair,tier,dex,apy24h,tvl,volume24h2,fees24h"
-    url = f"{supabase_url}/rest/v1/Tabla2?select={columns_to_select}&blockchain=eq.hyperevm"
-    headers = {
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=10,
+        # Reintentos con espera exponencial ante caídas temporales del gateway
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=["GET"]
+        )
+    ))
+    session.headers.update({
         "apikey": supabase_key,
         "Authorization": f"Bearer {supabase_key}"
+    })
+    return session
+
+REQUEST_TIMEOUT = (3, 10) # (conexión, lectura) en segundos
+
+# --- Caché stale-while-revalidate ---
+def bounded_put(cache, key, value, max_entries):
+    """
+    Guarda `value` en el dict `cache` como entrada más reciente y descarta las
+    más antiguas hasta dejar como mucho `max_entries`.
+    """
+    cache.pop(key, None)
+    cache[key] = value
+    while len(cache) > max_entries:
+        cache.pop(next(iter(cache)))
+
+def swr_cache(fresh_ttl, hard_ttl, max_entries=32):
+    """
+    Cachea el resultado en st.session_state["_swr_cache"] como (valor, fecha),
+    con un máximo de `max_entries` entradas.
+    Pasado `fresh_ttl` se devuelve el valor viejo al instante y se refresca en
+    un hilo en segundo plano; pasado `hard_ttl` se vuelve a pedir en el momento.
+    Solo se guardan los resultados correctos: si la función lanza una
+    excepción, en la llamada directa se propaga y en el refresco se conserva
+    el valor anterior.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args):
+            cache = st.session_state.setdefault("_swr_cache", {})
+            refreshing = st.session_state.setdefault("_swr_refreshing", set())
+            lock = st.session_state.setdefault("_swr_lock", threading.Lock())
+            key = (func.__name__, args)
+            entry = cache.get(key)
+            age = time.time() - entry[1] if entry else None
+
+            if entry is None or age >= hard_ttl:
+                value = func(*args)
+                with lock:
+                    bounded_put(cache, key, (value, time.time()), max_entries)
+                return value
+
+            if age > fresh_ttl:
+                # El lock evita lanzar varios refrescos de la misma clave a la vez
+                with lock:
+                    start = key not in refreshing
+                    refreshing.add(key)
+                if start:
+                    def refresh():
+                        try:
+                            value = func(*args)
+                        except Exception:
+                            return # Se sigue sirviendo el valor anterior
+                        finally:
+                            with lock:
+                                refreshing.discard(key)
+                        # Se sustituye la entrada completa de una vez
+                        with lock:
+                            bounded_put(cache, key, (value, time.time()), max_entries)
+                    thread = threading.Thread(target=refresh, daemon=True)
+                    add_script_run_ctx(thread)
+                    thread.start()
+            return entry[0]
+        return wrapper
+    return decorator
+
+# --- Función para cargar la lista de pares disponibles ---
+@st.cache_data(ttl=600) # La caché expira cada 10 minutos
+def load_pairs():
+    """
+    Carga únicamente la columna 'pair' de la blockchain 'hyperevm'
+    para poblar el selector, evitando descargar la tabla completa.
+    Si la consulta falla lanza SupabaseError, que st.cache_data no guarda.
+    """
+    url = f"{supabase_url}/rest/v1/Tabla2?select=pair&blockchain=eq.hyperevm"
+    try:
+        response = get_session().get(url, timeout=REQUEST_TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        raise SupabaseError(f"Ocurrió un error de conexión: {e}")
+    if response.status_code != 200:
+        raise SupabaseError(f"Error al consultar la API de Supabase: {response.status_code} - {response.text}")
+    try:
+        return sorted({row['pair'] for row in orjson.loads(response.content) if row.get('pair')})
+    except orjson.JSONDecodeError as e:
+        raise SupabaseError(f"Respuesta no válida de Supabase: {e}")
+
+# --- Columnas que se piden y se muestran ---
+COLUMNS = ('pair', 'tier', 'dex', 'apy24h', 'tvl', 'volume24h2', 'fees24h')
+NUMERIC_COLUMNS = ['apy24h', 'tvl', 'volume24h2', 'fees24h', 'tier']
+# Las columnas de texto se guardan como categorías: las comparaciones y el
+# groupby trabajan sobre códigos enteros en lugar de objetos str
+CATEGORY_DTYPES = {'pair': 'category', 'dex': 'category'}
+
+# --- Paginación por cursor (keyset) ---
+PAGE_SIZE = 100 # Filas por página pedidas a Supabase
+
+# Orden de las páginas; el cursor guarda estos valores de la última fila.
+# tier desempata los pools de un mismo par en un mismo DEX con igual APY.
+KEYSET_ORDER = (('apy24h', 'desc'), ('pair', 'asc'), ('dex', 'asc'), ('tier', 'asc'))
+KEYSET_ORDER_PARAM = ",".join(f"{col}.{direction}.nullslast" for col, direction in KEYSET_ORDER)
+
+def keyset_value(value):
+    """
+    Escribe un valor entre comillas para usarlo en un filtro de PostgREST.
+    """
+    escaped = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{escaped}"'
+
+def keyset_filter(cursor):
+    """
+    Construye el filtro `or=` de PostgREST que devuelve las filas posteriores
+    al cursor según KEYSET_ORDER (todas las columnas con NULLS LAST), o None
+    si no puede haber filas posteriores.
+
+    Para cada columna i se admite "columnas anteriores iguales al cursor y
+    columna i posterior al cursor"; con NULLS LAST, un NULL solo va seguido
+    de otros NULL y cualquier valor va seguido de los NULL.
+    """
+    terms = []
+    equal_so_far = []
+    for (col, direction), value in zip(KEYSET_ORDER, cursor):
+        if value is not None:
+            op = "lt" if direction == "desc" else "gt"
+            after = f"or({col}.{op}.{keyset_value(value)},{col}.is.null)"
+            terms.append(f"and({','.join(equal_so_far + [after])})" if equal_so_far else after)
+            equal_so_far.append(f"{col}.eq.{keyset_value(value)}")
+        else:
+            equal_so_far.append(f"{col}.is.null")
+    if not terms:
+        return None
+    return f"({','.join(terms)})"
+
+# --- Caché en disco compartida entre procesos ---
+PAGE_CACHE_TTL = 600 # Segundos que una página guardada en disco se considera fresca
+
+def init_page_cache_dir():
+    """
+    Crea el directorio privado (0700) de la caché en /dev/shm, memoria
+    compartida en Linux, o en el directorio temporal si no existe. Devuelve
+    None, desactivando la caché en disco, si no se puede crear o si el
+    directorio existente no es nuestro o lo pueden leer otros usuarios.
+    """
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    owner = os.getuid() if hasattr(os, "getuid") else None
+    path = os.path.join(base, f"liduido-{owner}" if owner is not None else "liduido")
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(info.st_mode):
+        return None
+    if owner is not None and (info.st_uid != owner or info.st_mode & 0o077):
+        return None
+    return path
+
+PAGE_CACHE_DIR = init_page_cache_dir()
+
+def page_cache_path(key):
+    """
+    Ruta del fichero Parquet que guarda la página identificada por `key`.
+    La URL de Supabase forma parte de la clave para no mezclar proyectos.
+    """
+    digest = hashlib.sha1(repr((supabase_url, key)).encode()).hexdigest()
+    return os.path.join(PAGE_CACHE_DIR, f"liduido_{digest}.parquet")
+
+def remove_file(path):
+    """
+    Borra un fichero ignorando que ya no exista o no se pueda borrar.
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def prune_page_cache():
+    """
+    Borra las páginas caducadas y los temporales que hayan quedado de
+    escrituras interrumpidas.
+    """
+    now = time.time()
+    for path in glob.glob(os.path.join(PAGE_CACHE_DIR, "liduido_*")):
+        try:
+            expired = now - os.path.getmtime(path) > PAGE_CACHE_TTL
+        except OSError:
+            continue
+        if expired:
+            remove_file(path)
+
+def read_page_cache(key):
+    """
+    Devuelve (DataFrame, cursor, total) desde disco si el fichero existe y es más
+    reciente que PAGE_CACHE_TTL, o None en caso contrario. Los ficheros
+    caducados se borran.
+    """
+    if PAGE_CACHE_DIR is None:
+        return None
+    path = page_cache_path(key)
+    try:
+        if time.time() - os.path.getmtime(path) > PAGE_CACHE_TTL:
+            remove_file(path)
+            return None
+        table = pq.read_table(path)
+    except (OSError, pa.ArrowException):
+        return None
+    next_cursor = orjson.loads(table.schema.metadata[b"next_cursor"])
+    total = orjson.loads(table.schema.metadata.get(b"total", b"null"))
+    return table.to_pandas(), tuple(next_cursor) if next_cursor is not None else None, total
+
+def write_page_cache(key, df, next_cursor, total):
+    """
+    Guarda la página en disco para que otros procesos la reutilicen. La
+    escritura va a un fichero temporal que luego se renombra, así nadie lee
+    un Parquet a medio escribir. De paso se borran las páginas caducadas.
+    """
+    if PAGE_CACHE_DIR is None:
+        return
+    prune_page_cache()
+    path = page_cache_path(key)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"next_cursor": orjson.dumps(next_cursor),
+        b"total": orjson.dumps(total)
+    })
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+    except (OSError, pa.ArrowException):
+        # La caché en disco es opcional; si falla seguimos con los datos en memoria
+        remove_file(tmp_path)
+
+def clear_page_cache():
+    """
+    Borra todas las páginas guardadas en disco.
+    """
+    if PAGE_CACHE_DIR is None:
+        return
+    for path in glob.glob(os.path.join(PAGE_CACHE_DIR, "liduido_*")):
+        remove_file(path)
+
+def parse_total(content_range):
+    """
+    Extrae el total de filas de una cabecera Content-Range de PostgREST
+    ("0-99/4521" o "*/0"); devuelve None si el total es desconocido ("*").
+    """
+    total = (content_range or "").rpartition("/")[2]
+    return int(total) if total.isdigit() else None
+
+# --- Último resultado válido y circuit breaker ---
+CIRCUIT_BREAKER_TTL = 60 # Segundos sin volver a consultar Supabase tras un fallo
+LAST_GOOD_MAX_ENTRIES = 32 # Páginas válidas que se recuerdan por sesión
+
+class SupabaseError(Exception):
+    """
+    Error al consultar Supabase; el mensaje es el que se muestra al usuario.
+    """
+
+def supabase_failure(message):
+    """
+    Registra un fallo de Supabase abriendo el circuit breaker durante
+    CIRCUIT_BREAKER_TTL segundos y lanza SupabaseError con el mensaje.
+    """
+    st.session_state["_circuit_open_until"] = time.time() + CIRCUIT_BREAKER_TTL
+    raise SupabaseError(message)
+
+def remember_last_good(key, page):
+    """
+    Guarda `page` como último resultado válido de `key`. Usa el mismo lock que
+    swr_cache porque también se llama desde el hilo de refresco.
+    """
+    last_good = st.session_state.setdefault("_last_good", {})
+    with st.session_state.setdefault("_swr_lock", threading.Lock()):
+        bounded_put(last_good, key, page, LAST_GOOD_MAX_ENTRIES)
+
+def load_page(pairs, cursor):
+    """
+    Llama a load_data desde el hilo del script y muestra los errores; load_data
+    no dibuja nada porque también se ejecuta en el hilo de refresco SWR. Si la
+    consulta falla se usa el último resultado válido de la página, si existe;
+    si no, devuelve None para que la interfaz sepa que la página falta.
+    """
+    try:
+        return load_data(pairs, cursor)
+    except SupabaseError as e:
+        last_good = st.session_state.get("_last_good", {})
+        if (pairs, cursor) in last_good:
+            st.warning(f"{e} Se muestran los últimos datos cargados.")
+            return last_good[(pairs, cursor)]
+        st.error(str(e))
+        return None
+
+# --- Función para cargar y procesar los datos con Requests ---
+@swr_cache(fresh_ttl=600, hard_ttl=3600) # Fresca 10 minutos, se sirve vieja hasta 1 hora
+def load_data(pairs: tuple, cursor: tuple = None):
+    """
+    Carga una página de datos desde la API REST de Supabase usando requests,
+    filtrando por blockchain = 'hyperevm' y por los pares seleccionados
+    directamente en el servidor.
+
+    Devuelve el DataFrame de la página, el cursor para pedir la siguiente
+    (o None si ya no quedan más filas) y el total de filas de la consulta,
+    que solo se pide en la primera página (None en las demás). Si la consulta
+    falla lanza SupabaseError, para que la caché no guarde el error.
+    """
+    key = (pairs, cursor)
+    cached_page = read_page_cache(key)
+    if cached_page is not None:
+        remember_last_good(key, cached_page)
+        return cached_page
+
+    # Con el circuito abierto no se vuelve a consultar una API que acaba de
+    # fallar; load_page usará el último resultado válido si lo hay
+    if time.time() < st.session_state.get("_circuit_open_until", 0):
+        raise SupabaseError("Supabase no responde; se reintentará en unos segundos.")
+
+    columns_to_select = ",".join(COLUMNS)
+    # Los valores van entre comillas para que PostgREST acepte pares con caracteres reservados
+    pairs_filter = quote(",".join(keyset_value(p) for p in pairs))
+    url = (
+        f"{supabase_url}/rest/v1/Tabla2?select={columns_to_select}"
+        f"&blockchain=eq.hyperevm&pair=in.({pairs_filter})"
+        f"&order={KEYSET_ORDER_PARAM}"
+    )
+    if cursor is not None:
+        after_cursor = keyset_filter(cursor)
+        if after_cursor is None:
+            return pd.DataFrame(), None, None
+        url += f"&or={quote(after_cursor)}"
+    headers = {
+        "Range-Unit": "items",
+        "Range": f"0-{PAGE_SIZE - 1}"
     }
+    if cursor is None:
+        # El total llega en Content-Range en la misma respuesta de la primera
+        # página; las demás no piden recuento
+        headers["Prefer"] = "count=exact"
     try:
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            data = response.json()
+        response = get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        if response.status_code in (200, 206):
+            data = orjson.loads(response.content)
             if data:
-                df = pd.DataFrame(data)
-                for col in ['apy24h', 'tvl', 'volume24h2', 'fees24h', 'tier']:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-                return df
+                # El cursor se toma de los valores crudos, antes de convertir nulos a 0
+                last = data[-1]
+                next_cursor = tuple(last.get(col) for col, _ in KEYSET_ORDER) if len(data) == PAGE_SIZE else None
+                total = parse_total(response.headers.get("Content-Range")) if cursor is None else None
+                # Construimos el DataFrame por columnas en lugar de una lista de dicts
+                cols = {col: [row.get(col) for row in data] for col in COLUMNS}
+                df = pd.DataFrame(cols)
+                # Conversión numérica en bloque: cast directo a float64 si los valores
+                # son válidos y, si hay texto no numérico, coerción a NaN
+                try:
+                    numeric = df[NUMERIC_COLUMNS].astype('float64')
+                except (ValueError, TypeError):
+                    numeric = df[NUMERIC_COLUMNS].apply(pd.to_numeric, errors='coerce')
+                df[NUMERIC_COLUMNS] = numeric.fillna(0)
+                df = df.astype(CATEGORY_DTYPES)
+                write_page_cache(key, df, next_cursor, total)
+                remember_last_good(key, (df, next_cursor, total))
+                return df, next_cursor, total
             else:
-                st.warning("No se encontraron datos para la blockchain 'hyperevm'.")
-                return pd.DataFrame()
+                # Sin filas no es un error; el mensaje lo muestra la interfaz
+                return pd.DataFrame(), None, None
         else:
-            st.error(f"Error al consultar la API de Supabase: {response.status_code} - {response.text}")
-            return pd.DataFrame()
-    except requests.exceptions.RequestException as e:
-        st.error(f"Ocurrió un error de conexión: {e}")
-        return pd.DataFrame()
+            supabase_failure(f"Error al consultar la API de Supabase: {response.status_code} - {response.text}")
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+        supabase_failure(f"Ocurrió un error de conexión: {e}")
 
 # --- Función para resaltar filas ---
-def highlight_dex(row):
+HIGHLIGHTED_DEXES = frozenset(('gliquid', 'gliquid_test'))
+# Array precalculado para np.isin, así no se reconstruye en cada tabla
+HIGHLIGHTED_DEX_VALUES = np.array(sorted(HIGHLIGHTED_DEXES), dtype=object)
+HIGHLIGHT_MARK = '●'
+
+def highlight_dex(dex):
     """
-    Resalta las filas de 'gliquid' y 'gliquid_test'.
+    Marca las filas de 'gliquid' y 'gliquid_test' a partir del array de DEXs,
+    devolviendo la columna de marcas que se muestra al inicio de la tabla.
     """
-    color = 'background-color: #2E4053' # Un color oscuro para resaltar
-    if row.dex in ['gliquid', 'gliquid_test']:
-        return [color] * len(row)
-    else:
-        return [''] * len(row)
+    return np.where(np.isin(dex, HIGHLIGHTED_DEX_VALUES), HIGHLIGHT_MARK, '')
+
+# --- Formato de la tabla ---
+# Se aplica en el navegador con column_config en lugar de un Styler de pandas
+TABLE_COLUMN_CONFIG = {
+    'highlight': st.column_config.TextColumn("", width="small"),
+    'tier': st.column_config.NumberColumn(format="%.2f"),
+    'apy24h': st.column_config.NumberColumn(format="accounting"),
+    'tvl': st.column_config.NumberColumn(format="accounting"),
+    'volume24h2': st.column_config.NumberColumn(format="accounting"),
+    'fees24h': st.column_config.NumberColumn(format="accounting")
+}
+
+# --- Filas que se muestran por par ---
+TOP_K = 20 # Filas de mayor APY; las de gliquid y gliquid_test se muestran siempre
+
+# --- Cálculo del APY de la calculadora ---
+@st.cache_resource
+def get_calc_apy():
+    """
+    Devuelve la función de cálculo del APY con su memo. Se crea una sola vez
+    por proceso con st.cache_resource porque Streamlit vuelve a ejecutar el
+    módulo en cada rerun y un lru_cache a nivel de módulo se perdería.
+    """
+    @lru_cache(maxsize=1024)
+    def calc_apy(tier: float, tvl: float, volume: float) -> float:
+        """
+        APY de 'gliquid_test' a partir del tier, el TVL y el volumen de 24h.
+        Se cachea por valores, así volver a una combinación ya vista no recalcula.
+        """
+        return (tier * volume / tvl) * 365 if tvl > 0 else 0.0
+    return calc_apy
+
+calc_apy = get_calc_apy()
+
+# --- Función para mostrar la comparativa de un par ---
+@st.fragment
+def render_pair(pair, pair_df, partial=False):
+    """
+    Muestra la calculadora de 'gliquid_test' y la tabla comparativa de un par.
+    Al ser un fragmento, los cambios en sus entradas solo re-ejecutan esta
+    función y no el script completo. `partial` indica que aún quedan páginas
+    por cargar, así que el par puede no tener todas sus filas.
+    """
+    with st.expander(f"Comparativa para el par: **{pair}**", expanded=True):
+
+        # --- Valores por defecto para la calculadora ---
+        gliquid_data = pair_df[pair_df['dex'] == 'gliquid']
+        if not gliquid_data.empty:
+            default_tier = float(gliquid_data.iloc[0]['tier'])
+            default_tvl = int(gliquid_data.iloc[0]['tvl'])
+            default_volume = int(gliquid_data.iloc[0]['volume24h2'])
+        else:
+            default_tier = 1.0
+            default_tvl = 100000
+            default_volume = 50000
+            if partial:
+                st.caption("La fila de 'gliquid' de este par puede estar en una página aún no cargada; la calculadora usa valores por defecto.")
+
+        # --- Calculadora para 'gliquid_test' ---
+        st.subheader("Calculadora APY para 'gliquid_test'")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            # CORRECCIÓN: Step de 0.05 para el tier
+            new_tier = st.number_input("Tier", value=default_tier, step=0.05, format="%.2f", key=f"tier_{pair}")
+        with col2:
+            # CORRECCIÓN: Step de 10000 para el TVL
+            new_tvl = st.number_input("TVL", value=default_tvl, step=10000, key=f"tvl_{pair}")
+        with col3:
+            # CORRECCIÓN: Step de 10000 para el Volumen
+            new_volume = st.number_input("Volumen 24h", value=default_volume, step=10000, key=f"vol_{pair}")
+
+        # Calcular el nuevo APY
+        new_apy = calc_apy(new_tier, new_tvl, new_volume)
+
+        # Crear la nueva fila
+        new_row_data = {
+            'pair': pair, 'tier': new_tier, 'dex': 'gliquid_test',
+            'apy24h': new_apy, 'tvl': new_tvl, 
+            'volume24h2': new_volume, 
+            'fees24h': 0
+        }
+
+        # --- Preparar y mostrar la tabla ---
+        # Supabase devuelve las filas ordenadas por APY descendente, así que solo
+        # hay que buscar la posición de la nueva fila (búsqueda binaria sobre el
+        # APY negado, que es ascendente) e insertarla columna a columna
+        pair_cols = {col: pair_df[col].to_numpy() for col in COLUMNS}
+        apy = pair_cols['apy24h']
+        if not np.all(apy[:-1] >= apy[1:]):
+            # Los NULL y textos no numéricos pasan a 0 y pueden romper el orden
+            # del servidor (p. ej. con APYs negativas); se reordena en local
+            order = np.argsort(-apy, kind='stable')
+            pair_cols = {col: values[order] for col, values in pair_cols.items()}
+            apy = pair_cols['apy24h']
+        position = np.searchsorted(-apy, -new_apy, side='left')
+        combined = {
+            col: np.insert(values, position, new_row_data[col])
+            for col, values in pair_cols.items()
+        }
+
+        # Se recortan solo las filas de otros DEXs: las destacadas (gliquid y
+        # gliquid_test) se conservan siempre para poder compararlas
+        highlighted = np.isin(combined['dex'], HIGHLIGHTED_DEX_VALUES)
+        others_budget = max(TOP_K - int(highlighted.sum()), 0)
+        keep = highlighted | (np.cumsum(~highlighted) <= others_budget)
+        sorted_cols = {col: values[keep] for col, values in combined.items()}
+        total_pair_rows = len(keep)
+        shown_rows = int(keep.sum())
+
+        # Pasamos una tabla Arrow directamente para evitar la conversión desde pandas
+        table = pa.table({'highlight': highlight_dex(sorted_cols['dex']), **sorted_cols})
+        st.dataframe(table, column_config=TABLE_COLUMN_CONFIG, use_container_width=True, hide_index=True)
+        if shown_rows < total_pair_rows:
+            st.caption(f"Se muestran {shown_rows} de {total_pair_rows} filas: las de mayor APY y siempre las de gliquid.")
 
 # --- Interfaz de la Aplicación ---
 st.title("📊 Comparador de Pares en DEXs para HyperEVM")
 st.markdown("Esta aplicación busca datos en Supabase y compara los pares disponibles en diferentes DEXs.")
 
-df = load_data()
+# Si la lista de pares falla se usa la última que cargó esta sesión
+try:
+    all_pairs = load_pairs()
+    st.session_state["_last_good_pairs"] = all_pairs
+except SupabaseError as e:
+    all_pairs = st.session_state.get("_last_good_pairs", [])
+    if all_pairs:
+        st.warning(f"{e} Se muestran los últimos pares cargados.")
+    else:
+        st.error(str(e))
 
-if not df.empty:
-    all_pairs = sorted(df['pair'].unique())
+if all_pairs:
     default_selection = ['kHYPE/WHYPE'] if 'kHYPE/WHYPE' in all_pairs else []
     
     selected_pairs = st.multiselect(
@@ -80,68 +579,70 @@ if not df.empty:
     
     st.markdown("---")
 
-    if selected_pairs:
-        for pair in selected_pairs:
-            with st.expander(f"Comparativa para el par: **{pair}**", expanded=True):
-                
-                pair_df = df[df['pair'] == pair].copy()
-                
-                # --- Valores por defecto para la calculadora ---
-                gliquid_data = pair_df[pair_df['dex'] == 'gliquid']
-                if not gliquid_data.empty:
-                    default_tier = float(gliquid_data.iloc[0]['tier'])
-                    default_tvl = int(gliquid_data.iloc[0]['tvl'])
-                    default_volume = int(gliquid_data.iloc[0]['volume24h2'])
-                else:
-                    default_tier = 1.0
-                    default_tvl = 100000
-                    default_volume = 50000
-
-                # --- Calculadora para 'gliquid_test' ---
-                st.subheader("Calculadora APY para 'gliquid_test'")
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    # CORRECCIÓN: Step de 0.05 para el tier
-                    new_tier = st.number_input("Tier", value=default_tier, step=0.05, format="%.2f", key=f"tier_{pair}")
-                with col2:
-                    # CORRECCIÓN: Step de 10000 para el TVL
-                    new_tvl = st.number_input("TVL", value=default_tvl, step=10000, key=f"tvl_{pair}")
-                with col3:
-                    # CORRECCIÓN: Step de 10000 para el Volumen
-                    new_volume = st.number_input("Volumen 24h", value=default_volume, step=10000, key=f"vol_{pair}")
-
-                # Calcular el nuevo APY
-                new_apy = (new_tier * new_volume / new_tvl) * 365 if new_tvl > 0 else 0
-
-                # Crear la nueva fila
-                new_row_data = {
-                    'pair': pair, 'tier': new_tier, 'dex': 'gliquid_test',
-                    'apy24h': new_apy, 'tvl': new_tvl, 
-                    'volume24h2': new_volume, 
-                    'fees24h': 0
-                }
-                new_row_df = pd.DataFrame([new_row_data])
-
-                # --- Preparar y mostrar la tabla ---
-                combined_df = pd.concat([new_row_df, pair_df])
-                sorted_df = combined_df.sort_values(by='apy24h', ascending=False).reset_index(drop=True)
-                
-                # CORRECCIÓN: Diccionario de formato para las columnas numéricas
-                formatter = {
-                    'tier': "{:.2f}",
-                    'apy24h': "{:,.2f}",
-                    'tvl': "{:,.2f}",
-                    'volume24h2': "{:,.2f}",
-                    'fees24h': "{:,.2f}"
-                }
-                
-                # Aplicamos el estilo para resaltar y formatear, y luego mostramos el DataFrame
-                st.dataframe(sorted_df.style.apply(highlight_dex, axis=1).format(formatter), use_container_width=True)
-    else:
+    if not selected_pairs:
+        # Sin pares seleccionados no hay nada que mostrar: no se consulta Supabase
         st.info("Por favor, selecciona al menos un par para ver la comparativa.")
+    else:
+        # En la sesión solo se guarda cuántas páginas se han pedido; el botón
+        # "Cargar más" suma una. Los cursores se encadenan en cada ejecución
+        # (la página i usa el cursor que devuelve la i-1), así que si el
+        # refresco SWR cambia una página las siguientes siguen a partir de ella.
+        selection = tuple(sorted(selected_pairs))
+        if st.session_state.get("selection") != selection:
+            st.session_state["selection"] = selection
+            st.session_state["page_count"] = 1
+        pages = []
+        failed = False
+        cursor = None
+        for _ in range(st.session_state["page_count"]):
+            page = load_page(selection, cursor)
+            if page is None:
+                # Se conserva el cursor de la página que falló para reintentarla
+                failed = True
+                break
+            pages.append(page)
+            cursor = page[1]
+            if cursor is None:
+                break # Ya no quedan más filas
+        df = pd.concat([page for page, _, _ in pages], ignore_index=True) if pages else pd.DataFrame()
+        if len(pages) > 1:
+            # Páginas refrescadas en momentos distintos pueden solaparse en el borde
+            df = df.drop_duplicates(subset=['pair', 'dex', 'tier'], ignore_index=True)
+        st.session_state["cursor"] = cursor
+        total_rows = pages[0][2] if pages else None
+
+        if not df.empty:
+            # Páginas con categorías distintas se concatenan como object; se recategoriza
+            df = df.astype(CATEGORY_DTYPES)
+            # Agrupamos una sola vez en lugar de filtrar el DataFrame completo por cada par
+            pair_groups = {pair: group for pair, group in df.groupby('pair', sort=False, observed=True)}
+            # Las páginas cortan el conjunto de todos los pares seleccionados, así
+            # que mientras queden páginas un par puede llegar incompleto
+            partial = failed or st.session_state["cursor"] is not None
+            if partial:
+                st.warning("Datos parciales: algunos pares pueden no tener todavía todas sus filas. Pulsa 'Cargar más' para completarlos.")
+            # Cada par es un fragmento: cambiar su calculadora solo vuelve a ejecutar ese par
+            for pair in selected_pairs:
+                # Sin .copy(): solo se lee y la tabla final se construye con np.insert
+                render_pair(pair, pair_groups.get(pair, df.iloc[0:0]), partial)
+
+            if total_rows is not None:
+                st.caption(f"Mostrando {len(df)} de {total_rows} filas.")
+            if failed:
+                # La página que falló sigue contada; basta con volver a ejecutar
+                if st.button('Reintentar'):
+                    st.rerun()
+            elif st.session_state["cursor"] is not None and st.button('Cargar más'):
+                st.session_state["page_count"] = len(pages) + 1
+                st.rerun()
+        else:
+            st.info("No hay datos disponibles para mostrar.")
 else:
     st.info("No hay datos disponibles para mostrar.")
 
 if st.button('Recargar Datos'):
     st.cache_data.clear()
+    clear_page_cache()
+    for key in ("selection", "page_count", "cursor", "_swr_cache", "_last_good", "_circuit_open_until"):
+        st.session_state.pop(key, None)
     st.rerun()